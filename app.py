@@ -1,14 +1,23 @@
 # app.py (Flask Version)
 
 import os
+import re
 import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import smtplib
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from email.mime.text import MIMEText
-from typing import List
+from itertools import islice
+from typing import Dict, List, Optional
 from flask_cors import CORS
 from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from apscheduler.schedulers.background import BackgroundScheduler
 from dotenv import load_dotenv
 
@@ -25,6 +34,7 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 FROM_EMAIL = os.getenv("FROM_EMAIL", SMTP_EMAIL)
 CHECK_INTERVAL_SECONDS = int(os.getenv("CHECK_INTERVAL_SECONDS", "300"))
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///domains.db")
+WHOIS_MAX_WORKERS = int(os.getenv("WHOIS_MAX_WORKERS", "8"))
 
 if not WHOISXML_API_KEY:
     raise RuntimeError("WHOISXML_API_KEY missing in .env")
@@ -34,8 +44,6 @@ if not WHOISXML_API_KEY:
 # ---------------------------
 app = Flask(__name__)
 
-# Replace your current CORS(...) call with this:
-
 CORS(
     app,
     resources={r"/*": {
@@ -45,7 +53,8 @@ CORS(
             "http://127.0.0.1:3000",
             "http://localhost:5173",
             "http://10.173.63.66:8000",
-            "http://127.0.0.1:5173"
+            "http://127.0.0.1:5173",
+            "https://id-preview--b652694e-c835-4745-a283-068f601b5bb3.lovable.app"
         ],
         "methods": ["GET", "POST", "OPTIONS"],
         "allow_headers": ["Content-Type"],
@@ -58,7 +67,6 @@ CORS(
 
 app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-CORS(app, origins=["https://id-preview--b652694e-c835-4745-a283-068f601b5bb3.lovable.app"])
 
 db = SQLAlchemy(app)
 
@@ -70,106 +78,406 @@ class Notification(db.Model):
     domain = db.Column(db.String(255), nullable=False)
     email = db.Column(db.String(255), nullable=False)
     notified = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.Float, default=time.time)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+
+    __table_args__ = (
+        # One pending registration per (domain, email); sent ones may repeat
+        db.Index(
+            "uq_notif_pending", "domain", "email",
+            unique=True,
+            sqlite_where=db.text("notified = 0"),
+            postgresql_where=db.text("notified = false")
+        ),
+        # Keeps the scheduler's pending scan proportional to pending rows
+        db.Index(
+            "idx_pending", "notified",
+            sqlite_where=db.text("notified = 0"),
+            postgresql_where=db.text("notified = false")
+        ),
+    )
+
+def _schema_lock(conn):
+    # Serialise schema changes between processes starting at the same time.
+    # pysqlite autocommits DDL unless a transaction is opened explicitly.
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.execute(db.text("LOCK TABLE notification IN ACCESS EXCLUSIVE MODE"))
+
+def _migrate_created_at():
+    # Older databases stored created_at as a float epoch; convert in place
+    with db.engine.begin() as conn:
+        _schema_lock(conn)
+        if inspect(conn).has_table("notification_old"):
+            raise RuntimeError(
+                "Table notification_old is left over from an interrupted migration; "
+                "restore its rows into notification and drop it before starting"
+            )
+
+        columns = {c["name"]: c["type"] for c in inspect(conn).get_columns("notification")}
+        if not isinstance(columns.get("created_at"), db.Float):
+            return
+
+        if conn.dialect.name == "postgresql":
+            conn.execute(db.text(
+                "ALTER TABLE notification "
+                "ALTER COLUMN created_at TYPE TIMESTAMP WITH TIME ZONE USING to_timestamp(created_at), "
+                "ALTER COLUMN created_at SET DEFAULT now()"
+            ))
+        elif conn.dialect.name == "sqlite":
+            # SQLite can't change a column's type or default, so rebuild the table
+            conn.execute(db.text("ALTER TABLE notification RENAME TO notification_old"))
+            for index in Notification.__table__.indexes:
+                conn.execute(db.text(f"DROP INDEX IF EXISTS {index.name}"))
+            _dedupe_pending(conn, "notification_old")
+            Notification.__table__.create(conn)
+            conn.execute(db.text(
+                "INSERT INTO notification (id, domain, email, notified, created_at) "
+                "SELECT id, domain, email, notified, datetime(created_at, 'unixepoch') "
+                "FROM notification_old"
+            ))
+            conn.execute(db.text("DROP TABLE notification_old"))
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL lets scheduler reads run alongside /notify writes; NORMAL skips per-commit fsync
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+def _dedupe_pending(conn, table: str = "notification"):
+    # The old SELECT-then-INSERT in /notify could register a pending pair twice; keep the oldest
+    conn.execute(db.text(
+        f"DELETE FROM {table} WHERE notified = :f AND id NOT IN ("
+        f"SELECT MIN(id) FROM {table} WHERE notified = :f GROUP BY domain, email)"
+    ), {"f": False})
+
+def _create_indexes():
+    # create_all() skips existing tables, so add new indexes explicitly
+    with db.engine.begin() as conn:
+        _schema_lock(conn)
+        existing = {ix["name"] for ix in inspect(conn).get_indexes("notification")}
+        if "uq_notif_pending" not in existing:
+            _dedupe_pending(conn)
+        for index in Notification.__table__.indexes:
+            if index.name not in existing:
+                index.create(conn)
 
 with app.app_context():
+    # Registered before the first connection so every pooled connection gets it
+    if db.engine.dialect.name == "sqlite":
+        event.listen(db.engine, "connect", _sqlite_pragmas)
     db.create_all()
+    _migrate_created_at()
+    _create_indexes()
+    # Don't hand setup connections to forked workers (gunicorn --preload)
+    db.engine.dispose()
 
 # ---------------------------
 # WHOIS API Check
 # ---------------------------
-def whoisxml_check(domain: str) -> bool:
-    url = "https://domain-availability.whoisxmlapi.com/api/v1"
+# One pooled session so lookups reuse keep-alive HTTPS connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    # Never smaller than the lookup pool, so workers don't wait on sockets
+    pool_maxsize=max(32, WHOIS_MAX_WORKERS),
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+WHOIS_API_URL = "https://domain-availability.whoisxmlapi.com/api/v1"
+
+AVAILABILITY_RE = re.compile(rb'"domainAvailability"\s*:\s*"([A-Za-z_]+)"')
+
+def _parse_availability(data: dict) -> bool:
+    # Handles multiple response styles
+    if "DomainInfo" in data:
+        status = data["DomainInfo"].get("domainAvailability")
+    else:
+        status = data.get("domainAvailability")
+
+    if status:
+        return status.upper() == "AVAILABLE"
+    return False
+
+def _whoisxml_lookup(domain: str) -> bool:
     params = {
         "apiKey": WHOISXML_API_KEY,
         "domainName": domain
     }
     try:
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-
-        # Handles multiple response styles
-        if "DomainInfo" in data:
-            status = data["DomainInfo"].get("domainAvailability")
-        else:
-            status = data.get("domainAvailability")
+        response = SESSION.get(WHOIS_API_URL, params=params, timeout=10)
+        # Fast path: pull the one field we need without building the dict
+        match = AVAILABILITY_RE.search(response.content)
+        if match:
+            return match.group(1).upper() == b"AVAILABLE"
+        return _parse_availability(response.json())
+    except Exception as e:
+        raise RuntimeError(f"WHOIS API error: {e}")
 
-        if status:
-            return status.upper() == "AVAILABLE"
 
+# In-process TTL cache: taken domains rarely change, available ones may flip soon
+WHOIS_CACHE_TTL_TAKEN = 3600
+WHOIS_CACHE_TTL_AVAILABLE = 300
+WHOIS_CACHE_MAX_SIZE = 50_000
+_whois_cache = {}
+_whois_cache_lock = threading.RLock()
+
+def _cache_get(domain: str):
+    with _whois_cache_lock:
+        cached = _whois_cache.get(domain)
+        if cached and cached[1] > time.time():
+            return cached[0]
+    return None
+
+def _cache_put(domain: str, available: bool):
+    now = time.time()
+    ttl = WHOIS_CACHE_TTL_AVAILABLE if available else WHOIS_CACHE_TTL_TAKEN
+    with _whois_cache_lock:
+        if len(_whois_cache) >= WHOIS_CACHE_MAX_SIZE:
+            expired = [k for k, (_, expires) in _whois_cache.items() if expires <= now]
+            for k in expired:
+                del _whois_cache[k]
+            if len(_whois_cache) >= WHOIS_CACHE_MAX_SIZE:
+                _whois_cache.pop(next(iter(_whois_cache)))
+        _whois_cache[domain] = (available, now + ttl)
+
+def whoisxml_check(domain: str, use_cache: bool = True) -> bool:
+    key = domain.lower()
+    cached = _cache_get(key) if use_cache else None
+    if cached is not None:
+        return cached
+
+    available = _whoisxml_lookup(key)
+    _cache_put(key, available)
+    return available
+
+
+# Shared pool for concurrent WHOIS lookups (reused across requests)
+WHOIS_EXECUTOR = ThreadPoolExecutor(max_workers=WHOIS_MAX_WORKERS, thread_name_prefix="whois")
+
+def _whoisxml_bulk_lookup(domains: List[str]) -> Dict[str, bool]:
+    payload = {
+        "apiKey": WHOISXML_API_KEY,
+        "domainNames": domains
+    }
+    try:
+        response = SESSION.post(WHOIS_API_URL, json=payload, timeout=10)
+        data = response.json()
     except Exception as e:
-        raise RuntimeError(f"WHOIS API error: {e}")
+        raise RuntimeError(f"WHOIS bulk API error: {e}")
+
+    if isinstance(data, dict):
+        data = data.get("domainsList") or data.get("domains") or []
+
+    results = {}
+    for entry in data:
+        info = entry.get("DomainInfo", entry)
+        name = (info.get("domainName") or "").lower()
+        if name:
+            results[name] = _parse_availability(entry)
+    return results
+
+def whoisxml_bulk_check(domains: List[str], use_cache: bool = True) -> Dict[str, bool]:
+    """Check many domains at once; domains whose lookup failed are left out.
+
+    With use_cache=False every domain is looked up fresh; results are still cached.
+    """
+    results = {}
+    missing = []
+    for domain in dict.fromkeys(d.lower() for d in domains):
+        cached = _cache_get(domain) if use_cache else None
+        if cached is None:
+            missing.append(domain)
+        else:
+            results[domain] = cached
 
-    return False
+    if missing:
+        try:
+            fetched = _whoisxml_bulk_lookup(missing)
+        except Exception as e:
+            print(f"WHOIS bulk failed, falling back to single lookups: {e}")
+            fetched = {}
+        for domain in missing:
+            if domain in fetched:
+                _cache_put(domain, fetched[domain])
+                results[domain] = fetched[domain]
+
+    # Anything the bulk response didn't cover is looked up individually
+    leftovers = [d for d in missing if d not in results]
+    futures = {WHOIS_EXECUTOR.submit(whoisxml_check, d, use_cache): d for d in leftovers}
+    for future in as_completed(futures):
+        try:
+            results[futures[future]] = future.result()
+        except Exception:
+            continue
+
+    return results
 
 
 # ---------------------------
 # Domain Suggestions
 # ---------------------------
-COMMON_TLDS = [".com", ".net", ".org", ".io", ".co", ".ai", ".xyz", ".tech", ".dev", ".app", ".tv", ".me", ".link", ".shop"]
+COMMON_TLDS = (".com", ".net", ".org", ".io", ".co", ".ai", ".xyz", ".tech", ".dev", ".app", ".tv", ".me", ".link", ".shop")
+PREFIXES = ("get", "try", "the", "my", "use", "go", "hey", "join", "is", "do", "pro", "ultra")
+SUFFIXES = ("app", "hq", "space", "online", "site", "hub", "labs", "io", "dev", "pro", "tv", "cloud")
+DOUBLE_SUFFIXES = ("hub.io", "labs.io", "dev.io", "app.io", "online.io")
+VARIATIONS = ("app.com", "pro.com", "online.com", "ai.com")
+
+# Built once at import; "{0}" is replaced by the query label
+SUGGESTION_TEMPLATES = tuple(
+    [f"{{0}}{tld}" for tld in COMMON_TLDS]
+    + [f"{p}{{0}}.com" for p in PREFIXES]
+    + [f"{{0}}{s}.com" for s in SUFFIXES]
+    + [f"{{0}}.{ds}" for ds in DOUBLE_SUFFIXES]
+    + [f"{{0}}{var}" for var in VARIATIONS]
+)
+
+LABEL_RE = re.compile(r"^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$")
+
+def _is_valid_domain(domain: str) -> bool:
+    # Cheap local check so the API is never asked about impossible names
+    return len(domain) <= 253 and all(LABEL_RE.match(lbl) for lbl in domain.split("."))
 
 def generate_suggestions(query: str, max_suggestions: int = 6) -> List[str]:
     query = query.lower()
     label = query.split(".")[0] if "." in query else query
 
-    candidates = []
+    def unique_candidates():
+        seen = set()
+        for tpl in SUGGESTION_TEMPLATES:
+            cand = tpl.format(label)
+            if cand not in seen and _is_valid_domain(cand):
+                seen.add(cand)
+                yield cand
 
-    # TLD variations
-    for tld in COMMON_TLDS:
-        candidates.append(f"{label}{tld}")
+    # Stop as soon as enough unique candidates are found
+    # There can never be more candidates than templates
+    limit = min(max(0, max_suggestions * 3), len(SUGGESTION_TEMPLATES))
+    return list(islice(unique_candidates(), limit))
 
-    # Prefixes
-    prefixes = ["get", "try", "the", "my", "use", "go", "hey", "join", "is", "do", "pro", "ultra"]
-    for p in prefixes:
-        candidates.append(f"{p}{label}.com")
 
-    # Suffixes
-    suffixes = ["app", "hq", "space", "online", "site", "hub", "labs", "io", "dev", "pro", "tv", "cloud"]
-    for s in suffixes:
-        candidates.append(f"{label}{s}.com")
+# ---------------------------
+# Send Email (SMTP)
+# ---------------------------
+class SMTPPool:
+    """Keeps one logged-in SMTP connection per thread instead of one per email."""
 
-    # Double suffixes
-    double_suffixes = ["hub.io", "labs.io", "dev.io", "app.io", "online.io"]
-    for ds in double_suffixes:
-        candidates.append(f"{label}.{ds}")
+    def __init__(self, messages_per_connection: int = 500):
+        self.messages_per_connection = messages_per_connection
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
 
-    # Character variations (add numbers/dashes)
-    variations = [f"{label}app.com", f"{label}pro.com", f"{label}online.com", f"{label}ai.com"]
-    for var in variations:
-        candidates.append(var)
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        try:
+            smtp.starttls()
+            smtp.login(SMTP_EMAIL, SMTP_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+        with self._lock:
+            self._connections.add(smtp)
+        self._local.conn = smtp
+        self._local.sent = 0
+        return smtp
+
+    def _close(self, smtp: smtplib.SMTP):
+        with self._lock:
+            self._connections.discard(smtp)
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
 
-    # Remove duplicates and return
-    return list(dict.fromkeys(candidates))[:max_suggestions * 3]
+    def _get(self) -> smtplib.SMTP:
+        smtp = getattr(self._local, "conn", None)
+        # No connection yet, or closed by flush() from another thread
+        if smtp is None or smtp.sock is None:
+            return self._connect()
 
+        # Rotate to respect provider per-connection caps
+        if self._local.sent >= self.messages_per_connection:
+            self._close(smtp)
+            return self._connect()
+
+        try:
+            status = smtp.noop()[0]
+        except (smtplib.SMTPException, OSError):
+            status = -1
+        if status != 250:
+            self._close(smtp)
+            return self._connect()
+        return smtp
+
+    def send_mail(self, to_email: str, msg: str):
+        smtp = self._get()
+        try:
+            smtp.sendmail(FROM_EMAIL, [to_email], msg)
+        except smtplib.SMTPServerDisconnected:
+            self._close(smtp)
+            smtp = self._connect()
+            smtp.sendmail(FROM_EMAIL, [to_email], msg)
+        self._local.sent += 1
+
+    def flush(self):
+        """Close every open connection; the next send reconnects."""
+        with self._lock:
+            connections = list(self._connections)
+        for smtp in connections:
+            self._close(smtp)
+
+
+SMTP_POOL = SMTPPool()
 
-# ---------------------------
-# Send Email (SMTP)
-# ---------------------------
 def send_email(to_email: str, subject: str, body: str):
     msg = MIMEText(body)
     msg["Subject"] = subject
     msg["From"] = FROM_EMAIL
     msg["To"] = to_email
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
-        smtp.starttls()
-        smtp.login(SMTP_EMAIL, SMTP_PASSWORD)
-        smtp.sendmail(FROM_EMAIL, [to_email], msg.as_string())
+    SMTP_POOL.send_mail(to_email, msg.as_string())
 
 
 # ---------------------------
 # API Routes (Flask)
 # ---------------------------
 
+MAX_SUGGESTIONS = 50
+
+def _get_json() -> dict:
+    # Parsed once per request; malformed or missing JSON becomes {}
+    data = request.get_json(cache=True, silent=True)
+    return data if isinstance(data, dict) else {}
+
+def _get_field(data: dict, key: str) -> Optional[str]:
+    # None means the field was sent with a non-string value
+    value = data.get(key, "")
+    if not isinstance(value, str):
+        return None
+    return value.strip().lower()
+
 @app.route("/")
 def home():
     return {"service": "Domain Suggester SaaS - Flask", "status": "running"}
 
 @app.route("/check", methods=["POST"])
 def check_domain():
-    data = request.json
-    query = data.get("query", "").strip().lower()
-    max_suggestions = int(data.get("max_suggestions", 6))
+    data = _get_json()
+    query = _get_field(data, "query")
+    if query is None:
+        return jsonify({"error": "query must be a string"}), 400
+    if not query:
+        return jsonify({"error": "missing query"}), 400
+
+    try:
+        max_suggestions = int(data.get("max_suggestions", 6))
+    except (TypeError, ValueError, OverflowError):
+        max_suggestions = None
+    if max_suggestions is None or not 0 <= max_suggestions <= MAX_SUGGESTIONS:
+        return jsonify({"error": f"max_suggestions must be an integer from 0 to {MAX_SUGGESTIONS}"}), 400
 
     if "." in query:
         domain = query
@@ -182,15 +490,9 @@ def check_domain():
         return jsonify({"error": str(e)}), 500
 
     # Generate suggestions ALWAYS (remove the "if not available:" condition)
-    suggestions = []
-    for cand in generate_suggestions(query, max_suggestions):
-        try:
-            if whoisxml_check(cand):
-                suggestions.append(cand)
-            if len(suggestions) >= max_suggestions:
-                break
-        except Exception:
-            continue
+    candidates = generate_suggestions(query, max_suggestions)
+    results = whoisxml_bulk_check(candidates)
+    suggestions = [cand for cand in candidates if results.get(cand)][:max_suggestions]
 
     return jsonify({
         "domain": domain,
@@ -202,58 +504,127 @@ def check_domain():
 
 @app.route("/notify", methods=["POST"])
 def notify():
-    data = request.json
-    domain = data.get("domain", "").strip().lower()
-    email = data.get("email", "").strip().lower()
+    data = _get_json()
+    domain = _get_field(data, "domain")
+    email = _get_field(data, "email")
+    if domain is None or email is None:
+        return jsonify({"error": "domain and email must be strings"}), 400
+    if not domain or not email:
+        return jsonify({"error": "missing domain or email"}), 400
 
     if "." not in domain:
         domain = f"{domain}.com"
 
-    exists = Notification.query.filter_by(
-        domain=domain, email=email, notified=False
-    ).first()
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite_insert(Notification).values(domain=domain, email=email).on_conflict_do_nothing()
+    elif dialect == "postgresql":
+        stmt = pg_insert(Notification).values(domain=domain, email=email).on_conflict_do_nothing()
+    else:
+        stmt = None
 
-    if exists:
+    if stmt is not None:
+        inserted = db.session.execute(stmt).rowcount
+        db.session.commit()
+    else:
+        exists = Notification.query.filter_by(
+            domain=domain, email=email, notified=False
+        ).first()
+        inserted = 0 if exists else 1
+        if inserted:
+            db.session.add(Notification(domain=domain, email=email))
+            db.session.commit()
+
+    if not inserted:
         return jsonify({"message": "Already registered for this domain"}), 200
 
-    record = Notification(domain=domain, email=email)
-    db.session.add(record)
-    db.session.commit()
-
     return jsonify({"message": "Notification registered"}), 201
 
 
 # ---------------------------
 # Background Checker
 # ---------------------------
+# Small pool so a tick's emails go out in parallel
+EMAIL_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
 def process_notifications():
     with app.app_context():  # <-- add this
         pending = Notification.query.filter_by(notified=False).all()
-        for note in pending:
+        if not pending:
+            return
+
+        # One WHOIS lookup per unique domain, however many subscribers it has.
+        # Skip cached answers so each domain really is re-checked every tick.
+        results = whoisxml_bulk_check(list({note.domain for note in pending}), use_cache=False)
+        ready = [note for note in pending if results.get(note.domain)]
+
+        futures = {
+            EMAIL_EXECUTOR.submit(
+                send_email,
+                note.email,
+                f"Domain Available: {note.domain}",
+                f"Good news! The domain {note.domain} is now available."
+            ): note
+            for note in ready
+        }
+        def deliver(future) -> bool:
+            note = futures[future]
             try:
-                if whoisxml_check(note.domain):
-                    try:
-                        send_email(
-                            note.email,
-                            f"Domain Available: {note.domain}",
-                            f"Good news! The domain {note.domain} is now available."
-                        )
-                        note.notified = True
-                        db.session.commit()
-                        print(f"[Scheduler] Email sent → {note.email}")
-                    except Exception as e:
-                        print(f"Email send failed: {e}")
+                future.result()
             except Exception as e:
-                print(f"WHOIS failed: {e}")
+                print(f"Email send failed: {e}")
+                return False
+            note.notified = True
+            print(f"[Scheduler] Email sent → {note.email}")
+            return True
+
+        sent = failed = 0
+        handled = set()
+        for future in as_completed(futures):
+            handled.add(future)
+            if deliver(future):
+                sent += 1
+            else:
+                failed += 1
+
+            # Cascading failures usually mean SMTP is down; retry next tick
+            if len(ready) >= 30 and failed * 3 >= len(ready):
+                for f in futures:
+                    f.cancel()
+                # Sends already in flight still finish; record them so they aren't repeated
+                in_flight = [f for f in futures if f not in handled and not f.cancelled()]
+                wait(in_flight)
+                for f in in_flight:
+                    if deliver(f):
+                        sent += 1
+                    else:
+                        failed += 1
+                print(f"[Scheduler] Aborting tick: {failed} failed, {sent} sent of {len(ready)}")
+                break
+
+        db.session.commit()
+        SMTP_POOL.flush()
 
 
-# Start scheduler
+# Scheduler is started by worker.py, or by the dev server below
 scheduler = BackgroundScheduler()
-scheduler.add_job(process_notifications, "interval", seconds=CHECK_INTERVAL_SECONDS)
-scheduler.start()
+# Never overlap ticks; a backlog of missed runs collapses into one
+scheduler.add_job(
+    process_notifications,
+    "interval",
+    seconds=CHECK_INTERVAL_SECONDS,
+    id="notify",
+    max_instances=1,
+    coalesce=True,
+    misfire_grace_time=60
+)
 
 # ---------------------------
 # Run Flask App
 # ---------------------------
 if __name__ == "__main__":
+    # debug=True re-runs this file in a reloader child; start only there so
+    # there is exactly one scheduler. Under gunicorn, use worker.py instead.
+    if os.getenv("RUN_SCHEDULER") == "1" and os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        scheduler.start()
     app.run(debug=True, host="0.0.0.0", port=8000)
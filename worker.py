@@ -0,0 +1,18 @@
+# worker.py (Background notification checker)
+
+import time
+from app import scheduler
+
+# ---------------------------
+# Run scheduler in its own process
+# ---------------------------
+if __name__ == "__main__":
+    if not scheduler.running:
+        scheduler.start()
+    print("[Worker] Scheduler running")
+
+    try:
+        while True:
+            time.sleep(60)
+    except (KeyboardInterrupt, SystemExit):
+        scheduler.shutdown()